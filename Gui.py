@@ -1,34 +1,78 @@
+import os
 import tkinter as tk
 import customtkinter
-from tkinter import filedialog, Toplevel
+from tkinter import filedialog, messagebox, Toplevel
 import subprocess
 import threading
+import queue
+import json
+import tempfile
+import time
 
 # System Settings
 customtkinter.set_appearance_mode("System")
 customtkinter.set_default_color_theme("blue")
 
+ROW_HEIGHT = 20
+ALL = "All"
+
 # Function to open file explorer and get directory
 def browse_directory():
     folder_selected = filedialog.askdirectory()
     if folder_selected:
         opt_dir.set(folder_selected)
 
+# Function to open file explorer and get codes files
+def browse_codes():
+    files_selected = filedialog.askopenfilenames(filetypes=[("CSV files", "*.csv"), ("All files", "*")])
+    if files_selected:
+        codes_files.set(";".join(files_selected))
+
+# Function to open file explorer and get the library directory
+def browse_library():
+    folder_selected = filedialog.askdirectory()
+    if folder_selected:
+        library_dir.set(folder_selected)
+
+# Function to build the main.py command, so the preview and the run share the same arguments
+def build_command(output_dir, options):
+    cmd = ['python3', 'main.py', output_dir]
+
+    codes = [path.strip() for path in codes_files.get().split(";") if path.strip()]
+    if codes:
+        cmd += ['-c'] + codes
+    if library_dir.get():
+        cmd += ['-o', library_dir.get()]
+
+    return cmd + options
+
 # Function to run script with progress bar
 def run_script():
     output_dir = opt_dir.get()
     if not output_dir:
         return
-    
+
     options = []
     if run_options['dry_run']: options.append('-n')
     if run_options['verbose_run']: options.append('-v')
     if run_options['force_run']: options.append('-f')
     if run_options['copy_run']: options.append('-C')
     if run_options['quit_on_error']: options.append('-Q')
-    
-    cmd = ['python3', 'main.py', output_dir] + options
-    
+
+    # Leave out rows deselected in the preview, refusing to run if the preview no longer matches the inputs
+    exclude_file = None
+    if preview['excluded'] and preview['command'] != build_command(output_dir, []):
+        messagebox.showwarning("Preview out of date", "The directory, codes or output changed since the preview was made. "
+                               "Preview again and reselect the files to exclude before running.")
+        return
+    if preview['excluded']:
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', encoding="utf-8", delete=False) as f:
+            f.writelines(f"{preview['rows'][index][0]}\n" for index in preview['excluded'])
+        exclude_file = f.name
+        options += ['-x', exclude_file]
+
+    cmd = build_command(output_dir, options)
+
     progress_window = Toplevel(app)
     progress_window.title("Progress")
     progress_window.geometry("300x100")
@@ -37,19 +81,198 @@ def run_script():
     progress_bar = customtkinter.CTkProgressBar(progress_window, width=250)
     progress_bar.set(0)
     progress_bar.pack(pady=10)
-    
+
     def execute():
         process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         while process.poll() is None:
             progress_bar.set(progress_bar.get() + 10)
         progress_bar.set(100)
         progress_label.configure(text="Completed!")
-    
+
+        if exclude_file:
+            os.remove(exclude_file)
+
     threading.Thread(target=execute, daemon=True).start()
 
+# Function to start loading a dry-run plan into the preview pane
+def run_preview():
+    output_dir = opt_dir.get()
+    if not output_dir:
+        return
+
+    if preview['process'] and preview['process'].poll() is None:
+        preview['process'].kill()
+
+    preview.update(rows=[], view=[], excluded=set(), top=0, anchor=None, command=build_command(output_dir, []), done=False,
+                   boards=set(), subjects=set(), reasons=set())
+    preview['queue'] = queue.Queue()
+    for menu in filter_menus.values():
+        menu.set(ALL)
+
+    process = subprocess.Popen(build_command(output_dir, ['--plan']), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    preview['process'] = process
+
+    # Read the plan in the background, handing rows over in batches
+    def read_plan(process, rows_queue):
+        batch = []
+        for line in process.stdout:
+            if not line.startswith("{"):
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            batch.append((entry.get('source') or "", entry.get('target') or "", entry.get('action') or "",
+                          entry.get('board') or "", entry.get('subject') or "", entry.get('reason') or ""))
+            if len(batch) >= 1000:
+                rows_queue.put(batch)
+                batch = []
+        rows_queue.put(batch)
+        rows_queue.put(None)
+
+    threading.Thread(target=read_plan, args=(process, preview['queue']), daemon=True).start()
+    load_preview(preview['queue'])
+
+# Function to move loaded rows into the preview without blocking the UI
+def load_preview(rows_queue):
+    if rows_queue is not preview['queue']:
+        return  # A newer preview has started
+
+    deadline = time.monotonic() + 0.03
+    rows = preview['rows']
+    menus_changed = False
+    while time.monotonic() < deadline:
+        try:
+            batch = rows_queue.get_nowait()
+        except queue.Empty:
+            break
+        if batch is None:
+            preview['done'] = True
+            break
+
+        start = len(rows)
+        rows.extend(batch)
+        filters = selected_filters()
+        preview['view'].extend(index for index in range(start, len(rows)) if matches_filter(rows[index], filters))
+
+        for source, target, action, board, subject, reason in batch:
+            for key, value in (('boards', board), ('subjects', subject), ('reasons', reason)):
+                if value and value not in preview[key]:
+                    preview[key].add(value)
+                    menus_changed = True
+
+    if menus_changed:
+        filter_menus['board'].configure(values=[ALL] + sorted(preview['boards']))
+        filter_menus['subject'].configure(values=[ALL] + sorted(preview['subjects']))
+        filter_menus['reason'].configure(values=[ALL, "Placed"] + sorted(preview['reasons']))
+
+    draw_preview()
+    if not preview['done']:
+        app.after(50, load_preview, rows_queue)
+
+# Function to read the selected filters once, rather than once per row
+def selected_filters():
+    return tuple(filter_menus[key].get() for key in ('board', 'subject', 'reason'))
+
+# Function to check a row against the selected filters
+def matches_filter(row, filters):
+    source, target, action, board, subject, reason = row
+    board_filter, subject_filter, reason_filter = filters
+
+    if board_filter != ALL and board != board_filter:
+        return False
+    if subject_filter != ALL and subject != subject_filter:
+        return False
+    if reason_filter == "Placed":
+        return action != "skip"
+    if reason_filter != ALL and reason != reason_filter:
+        return False
+    return True
+
+# Function to rebuild the filtered view when a filter changes
+def apply_filter(_=None):
+    filters = selected_filters()
+    preview['view'] = [index for index, row in enumerate(preview['rows']) if matches_filter(row, filters)]
+    preview['top'] = 0
+    preview['anchor'] = None
+    draw_preview()
+
+# Function to exclude or include every row matching the filters
+def exclude_shown(exclude=True):
+    if exclude:
+        preview['excluded'].update(preview['view'])
+    else:
+        preview['excluded'].difference_update(preview['view'])
+    draw_preview()
+
+# Function to draw only the rows currently visible in the preview
+def draw_preview():
+    view, rows, excluded = preview['view'], preview['rows'], preview['excluded']
+    visible = max(1, preview_canvas.winfo_height() // ROW_HEIGHT)
+    preview['top'] = max(0, min(preview['top'], len(view) - visible))
+    top = preview['top']
+
+    # Reuse a fixed pool of text items instead of one per row
+    while len(row_items) < visible + 1:
+        row_items.append(preview_canvas.create_text(5, len(row_items) * ROW_HEIGHT + 2, anchor="nw", font=("Courier", 10)))
+
+    for i, item in enumerate(row_items):
+        index = top + i
+        if i <= visible and index < len(view):
+            source, target, action, board, subject, reason = rows[view[index]]
+            mark = " " if view[index] in excluded else "x"
+            preview_canvas.itemconfigure(item, text=f"[{mark}] {action:<6} {source} -> {target or reason}",
+                                         fill="gray" if view[index] in excluded else text_color)
+        else:
+            preview_canvas.itemconfigure(item, text="")
+
+    if view:
+        preview_scrollbar.set(top / len(view), min(1, (top + visible) / len(view)))
+    else:
+        preview_scrollbar.set(0, 1)
+
+    status = "Loaded" if preview['done'] else "Loading"
+    preview_label.configure(text=f"{status} {len(rows)} files, {len(view)} shown, {len(excluded)} excluded")
+
+# Function to scroll the preview from the scrollbar
+def scroll_preview(*args):
+    visible = max(1, preview_canvas.winfo_height() // ROW_HEIGHT)
+    if args[0] == "moveto":
+        preview['top'] = int(float(args[1]) * len(preview['view']))
+    elif args[0] == "scroll":
+        step = visible if args[2] == "pages" else 1
+        preview['top'] += int(args[1]) * step
+    draw_preview()
+
+# Function to scroll the preview with the mouse wheel
+def wheel_preview(event):
+    if event.num == 4 or event.delta > 0:
+        preview['top'] -= 3
+    else:
+        preview['top'] += 3
+    draw_preview()
+
+# Function to toggle a row (or a range with shift) between included and excluded
+def click_preview(event):
+    position = preview['top'] + event.y // ROW_HEIGHT
+    if position >= len(preview['view']):
+        return
+
+    if event.state & 0x1 and preview['anchor'] is not None:
+        start, end = sorted((preview['anchor'], position))
+        indexes = preview['view'][start:end + 1]
+        if preview['view'][preview['anchor']] in preview['excluded']:
+            preview['excluded'].update(indexes)
+        else:
+            preview['excluded'].difference_update(indexes)
+    else:
+        preview['excluded'].symmetric_difference_update({preview['view'][position]})
+        preview['anchor'] = position
+    draw_preview()
+
 # App Frame
 app = customtkinter.CTk()
-app.geometry("500x300")
+app.geometry("900x800")
 app.title("Paperctl")
 
 # UI Elements
@@ -63,6 +286,19 @@ output_dir.pack(pady=10)
 browse_button = customtkinter.CTkButton(app, text="Browse", command=browse_directory)
 browse_button.pack(pady=10)
 
+settings = customtkinter.CTkFrame(app, fg_color="transparent")
+settings.pack(pady=5)
+
+codes_files = tk.StringVar()
+customtkinter.CTkLabel(settings, text="Codes files").grid(row=0, column=0, padx=5, pady=5, sticky="e")
+customtkinter.CTkEntry(settings, width=400, height=30, textvariable=codes_files).grid(row=0, column=1, padx=5, pady=5)
+customtkinter.CTkButton(settings, text="Browse", width=80, command=browse_codes).grid(row=0, column=2, padx=5, pady=5)
+
+library_dir = tk.StringVar()
+customtkinter.CTkLabel(settings, text="Output directory").grid(row=1, column=0, padx=5, pady=5, sticky="e")
+customtkinter.CTkEntry(settings, width=400, height=30, textvariable=library_dir).grid(row=1, column=1, padx=5, pady=5)
+customtkinter.CTkButton(settings, text="Browse", width=80, command=browse_library).grid(row=1, column=2, padx=5, pady=5)
+
 run_options = {
     "dry_run": False,
     "verbose_run": False,
@@ -71,8 +307,62 @@ run_options = {
     "quit_on_error": False
 }
 
-run_button = customtkinter.CTkButton(app, text="Run Script", command=run_script)
-run_button.pack(pady=20)
+preview = {
+    "process": None,
+    "queue": None,
+    "command": None,
+    "done": True,
+    "rows": [],
+    "view": [],
+    "excluded": set(),
+    "top": 0,
+    "anchor": None,
+    "boards": set(),
+    "subjects": set(),
+    "reasons": set(),
+}
+
+buttons = customtkinter.CTkFrame(app, fg_color="transparent")
+buttons.pack(pady=10)
+
+preview_button = customtkinter.CTkButton(buttons, text="Preview", command=run_preview)
+preview_button.pack(side="left", padx=5)
+
+run_button = customtkinter.CTkButton(buttons, text="Run Script", command=run_script)
+run_button.pack(side="left", padx=5)
+
+# Preview pane
+filters = customtkinter.CTkFrame(app, fg_color="transparent")
+filters.pack(fill="x", padx=10)
+
+filter_menus = {}
+for key in ("board", "subject", "reason"):
+    customtkinter.CTkLabel(filters, text=key.capitalize()).pack(side="left", padx=(5, 2))
+    filter_menus[key] = customtkinter.CTkOptionMenu(filters, values=[ALL], width=140, command=apply_filter)
+    filter_menus[key].pack(side="left", padx=2)
+
+customtkinter.CTkButton(filters, text="Include shown", width=100, command=lambda: exclude_shown(False)).pack(side="right", padx=2)
+customtkinter.CTkButton(filters, text="Exclude shown", width=100, command=exclude_shown).pack(side="right", padx=2)
+
+preview_label = customtkinter.CTkLabel(app, text="Preview a directory to see what would happen")
+preview_label.pack(anchor="w", padx=15)
+
+preview_frame = customtkinter.CTkFrame(app)
+preview_frame.pack(fill="both", expand=True, padx=10, pady=10)
+
+text_color = "black" if customtkinter.get_appearance_mode() == "Light" else "white"
+preview_canvas = tk.Canvas(preview_frame, highlightthickness=0, bg="white" if text_color == "black" else "gray14")
+preview_canvas.pack(side="left", fill="both", expand=True)
+
+preview_scrollbar = customtkinter.CTkScrollbar(preview_frame, command=scroll_preview)
+preview_scrollbar.pack(side="right", fill="y")
+
+row_items = []
+preview_canvas.bind("<Configure>", lambda event: draw_preview())
+preview_canvas.bind("<Button-1>", click_preview)
+preview_canvas.bind("<MouseWheel>", wheel_preview)
+preview_canvas.bind("<Button-4>", wheel_preview)
+preview_canvas.bind("<Button-5>", wheel_preview)
 
 # Run app
 app.mainloop()
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import os
+import sys
 import shutil
 import zipfile
 import argparse
@@ -9,9 +10,22 @@ import mimetypes
 from urllib.parse import urlparse
 from datetime import datetime
 import csv
+import json
+import zlib
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 
 args = {}
 codes = {}
+review_queue = []
+
+review_fields = ["path", "board", "code", "type", "month", "year", "number", "variant", "pattern"]
+review_required = ["board", "code", "type", "month", "year"]
+
+manifest_name = ".paperctl-manifest.csv"
+manifest_fields = ["name", "size", "mtime", "sha256"]
+hash_chunk_size = 1024 * 1024
 
 def is_url(url):
     url = str(url).strip()
@@ -212,6 +226,8 @@ def parse_pattern(file_path, is_file):
                 type_str = t
                 break
         else:
+            if args.manual and is_file:
+                queue_review(file_path, None, code, None, *parse_paper(paper), year, month, None)
             return None
 
     if match:
@@ -229,25 +245,15 @@ def parse_pattern(file_path, is_file):
     else:
         if args.verbose and is_file:
             print("Skipping, board does not exist")
+        if args.manual and is_file:
+            queue_review(file_path, None, extracted_values.get("code"), parse_type(extracted_values.get("type_str")), *parse_paper(extracted_values.get("paper")), extracted_values.get("year"), extracted_values.get("month"), pattern["pattern_number"])
         return None
 
     if not paper:
         paper = extracted_values.get("paper")
 
-    if paper:
-        if paper.startswith("0"): 
-            number, variant = paper[1], "0"
-        elif len(paper) == 1:
-            number, variant = paper, "0"
-        elif paper[-1].lower() == "r":
-            number, variant = paper[:-1], "R"
-        elif len(paper) == 2 and paper.isdigit():
-            number, variant = paper[0], paper[1]
-        else:
-            number, variant = paper, "0"
-        paper = None
-    else:
-        number, variant = None, None
+    number, variant = parse_paper(paper)
+    paper = None
     
     if extracted_values:
         date = extracted_values.get("date")
@@ -272,19 +278,13 @@ def parse_pattern(file_path, is_file):
     if not code and extracted_values:
             code = extracted_values.get("code")
 
-    if args.manual and is_file: 
-        if not code:
-            code = input("Enter code here: ")
-        if not type_str:
-            type_str = input("Enter type here: ")
-        if not month:
-            month = input("Enter month here: ")
-        if not year:
-            month = input("Enter year here: ")
-        if not number:
-            number = input("Enter paper number here: ")
-        if not variant:
-            variant = input("Enter paper variant here: ")
+    if args.manual and is_file:
+        # Defer anything we can't place to the review queue instead of blocking on input
+        known_code = code if code and f"{board}_{str(code).upper()}" in codes else None
+        if not known_code or not type_str or not month or not year:
+            # Names matching no pattern only get the last pattern's board as a guess, so leave it to the operator
+            queue_review(file_path, board if match else None, code, type_str, number, variant, year, month, pattern_number)
+            return None
 
     if board and code: 
         name = f"{board}_{code}"
@@ -305,6 +305,22 @@ def parse_pattern(file_path, is_file):
 
     return general_subject, detailed_subject, board, level, master_code, code, type_str, number, variant, year, month, pattern_number, regex
 
+def parse_paper(paper):
+    # Split a paper string such as 12, 02 or 1R into its number and variant
+    if not paper:
+        return None, None
+
+    if paper.startswith("0"): 
+        return paper[1], "0"
+    elif len(paper) == 1:
+        return paper, "0"
+    elif paper[-1].lower() == "r":
+        return paper[:-1], "R"
+    elif len(paper) == 2 and paper.isdigit():
+        return paper[0], paper[1]
+    else:
+        return paper, "0"
+
 def parse_date(month, year, type_str, board, pattern):
     # Parses correct month and year depending on the board and pattern
     year = parse_year(year)
@@ -418,6 +434,282 @@ def parse_year(year, short=False):
     else:
         return int(f"20{year[-2:]}" if len(year) == 2 else year)  # Convert to 4 digits if necessary
 
+pdf_stream_pattern = re.compile(rb"stream\r?\n")
+pdf_token_pattern = re.compile(rb"\(|[A-Za-z'\"*]+")
+pdf_special_pattern = re.compile(rb"[()\\]")
+pdf_escape_pattern = re.compile(rb"\\([nrtbf()\\]|[0-7]{1,3})?")
+pdf_break_operators = {b"Td", b"TD", b"Tm", b"T*", b"ET", b"'", b'"'}
+pdf_escapes = {b"n": b"\n", b"r": b"\r", b"t": b"\t", b"b": b"\b", b"f": b"\f", b"(": b"(", b")": b")", b"\\": b"\\"}
+
+sniff_stream_bytes = 256 * 1024
+sniff_text_chars = 16 * 1024
+
+sniff_sessions = {
+    'January': ['january', 'jan'],
+    'Feb-March': ['february/march', 'feb/mar', 'feb/march', 'february', 'march'],
+    'May-June': ['may/june', 'may', 'june', 'summer'],
+    'Oct-Nov': ['october/november', 'oct/nov', 'october', 'november', 'winter'],
+    'Specimen': ['specimen'],
+}
+sniff_types = {
+    'Mark Scheme': [r"mark scheme"],
+    'Examiner Report': [r"examiners?'? reports?", r"principal examiner"],
+    'Grade Thresholds': [r"grade thresholds"],
+    'Confidential Instructions': [r"confidential instructions"],
+    'Inserts': [r"\binsert\b(?!\s*\(enclosed\))"],
+    'Pre-release Materials': [r"pre-release"],
+}
+
+sniff_cache = {"files": {}, "texts": {}, "timeouts": {}}
+sniff_cache_dirty = False
+
+def load_sniff_cache(cache_file):
+    """Load cached first page text, keyed by content hash."""
+    global sniff_cache
+
+    if os.path.isfile(cache_file):
+        try:
+            with open(cache_file, 'r') as f:
+                cache = json.load(f)
+            sniff_cache = {key: cache.get(key, {}) for key in ("files", "texts", "timeouts")}
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable sniff cache {cache_file}: {e}")
+
+def save_sniff_cache(cache_file):
+    """Write the first page text cache back if anything was added, replacing the file in one step."""
+    if not sniff_cache_dirty or args.dry_run:
+        return
+
+    # Texts stay keyed by content, but paths of files that have since been sorted are stale
+    sniff_cache["files"] = {path: known for path, known in sniff_cache["files"].items() if os.path.exists(path)}
+
+    temp_file = f"{cache_file}.tmp"
+    with open(temp_file, 'w') as f:
+        json.dump(sniff_cache, f)
+    os.replace(temp_file, cache_file)
+
+def pdf_unescape(string):
+    # Decode the escapes allowed inside a PDF literal string
+    def replace(escape):
+        escape = escape.group(1)
+        if escape in pdf_escapes:
+            return pdf_escapes[escape]
+        if escape:
+            return bytes([int(escape, 8) & 0xFF])
+        return b""
+
+    return pdf_escape_pattern.sub(replace, string).decode("latin-1")
+
+def pdf_text(content, deadline):
+    """
+    Pull the literal strings out of a content stream in a single linear pass, breaking words on text positioning.
+    Stops early, returning what it has, once the deadline passes.
+    """
+    words = []
+    i = 0
+    steps = 0
+    expired = False
+    while i < len(content) and not expired:
+        steps += 1
+        if steps % 256 == 0 and time.monotonic() > deadline:
+            break
+
+        token = pdf_token_pattern.search(content, i)
+        if not token:
+            break
+        i = token.end()
+
+        if token.group() != b"(":
+            if token.group() in pdf_break_operators:
+                words.append(" ")
+            continue
+
+        # Scan to the matching close paren, allowing balanced nesting and escapes
+        depth = 1
+        start = i
+        while depth:
+            steps += 1
+            if steps % 256 == 0 and time.monotonic() > deadline:
+                expired = True
+                break
+
+            special = pdf_special_pattern.search(content, i)
+            if not special:
+                i = len(content)
+                break
+            i = special.end()
+
+            char = special.group()
+            if char == b"\\":
+                i += 1
+            elif char == b"(":
+                depth += 1
+            else:
+                depth -= 1
+
+        # A single string longer than a whole cover page is not cover text
+        words.append(pdf_unescape(content[start:i - 1 if not depth else i][:sniff_text_chars]))
+
+    return re.sub(r"\s+", " ", "".join(words))
+
+def pdf_streams(data, deadline, max_bytes):
+    # Yield decoded content streams from a PDF prefix until the time budget runs out
+    position = 0
+    while time.monotonic() <= deadline:
+        match = pdf_stream_pattern.search(data, position)
+        if not match:
+            return
+
+        start = match.end()
+        end = data.find(b"endstream", start)
+        if end == -1:
+            return
+        position = end + len(b"endstream")
+
+        header = data[max(0, match.start() - 512):match.start()]
+        header = header[header.rfind(b"<<"):]
+        if b"/Image" in header or b"/DCTDecode" in header or b"/FontFile" in header:
+            continue
+
+        raw = data[start:end]
+        if b"/FlateDecode" in header:
+            try:
+                raw = zlib.decompressobj().decompress(raw, min(max_bytes, sniff_stream_bytes))
+            except zlib.error:
+                continue
+        elif b"/Filter" in header:
+            continue
+
+        yield raw[:sniff_stream_bytes]
+
+def classify_text(text):
+    """
+    Match first page text against the codes table.
+    Returns a dictionary of review fields or None if no known code and session are found.
+    """
+    lowered = text.lower()
+    upper = text.upper()
+    board = code = number = variant = month = year = None
+
+    # Question papers print CODE/PAPER, Edexcel mark schemes print (CODE) and Paper N
+    candidates = re.findall(r"\b([0-9][A-Z0-9]{3})\s*/\s*([0-9]{1,2}[A-Z]?R?)\b", upper)
+    paper = re.search(r"\bPAPER\s+([0-9]{1,2}[A-Z]?R?)\b", upper)
+    candidates += [(candidate, paper.group(1) if paper else None) for candidate in re.findall(r"\(\s*([0-9][A-Z0-9]{3})\s*\)", upper)]
+
+    for candidate, paper in candidates:
+        matches = [key for key in codes if key.endswith(f"_{candidate}")]
+        if not matches:
+            continue
+        if len(matches) > 1:
+            preferred = "Edexcel" if "pearson" in lowered or "edexcel" in lowered else "Cambridge"
+            matches = [key for key in matches if key.startswith(f"{preferred}_")] or matches
+        board = codes[matches[0]]["board"]
+        code = candidate
+        number, variant = parse_paper(paper)
+        break
+
+    if not code:
+        return None
+
+    sessions = {abbr: full for full, abbrs in sniff_sessions.items() for abbr in abbrs}
+    session_pattern = create_pattern(sorted((re.escape(abbr) for abbr in sessions), key=len, reverse=True))
+    session = re.search(rf"\b({session_pattern})\s+([0-9]{{4}})\b", lowered)
+    if not session:
+        return None
+    month, year = sessions[session.group(1)], session.group(2)
+
+    type_str = "Question Paper"
+    for full_name, patterns in sniff_types.items():
+        if any(re.search(pattern, lowered) for pattern in patterns):
+            type_str = full_name
+            break
+
+    values = {"board": board, "code": code, "type": type_str, "month": month, "year": year, "number": number, "variant": variant}
+    return {field: value for field, value in values.items() if value}
+
+def cached_sniff_text(digest):
+    # Cached text for a digest, or None if it has to be read again
+    if digest in sniff_cache["texts"]:
+        return sniff_cache["texts"][digest]
+
+    timeout = sniff_cache["timeouts"].get(digest)
+    if timeout and not args.sniff_retry and args.sniff_time <= timeout["budget"]:
+        return timeout["text"]
+    return None
+
+def sniff_text(file_path):
+    """
+    Extract the first page text of a PDF, reading at most --sniff-bytes within --sniff-time.
+    Text is cached by content hash so a file is only read once. Reads that run out of time are cached
+    with the budget they had, and retried with --sniff-retry or a larger --sniff-time.
+    """
+    global sniff_cache_dirty
+
+    stat = file_path.stat()
+    key = str(file_path.resolve())
+    known = sniff_cache["files"].get(key)
+    if known and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+        text = cached_sniff_text(known[2])
+        if text is not None:
+            return text
+
+    deadline = time.monotonic() + args.sniff_time
+    with open(file_path, 'rb') as f:
+        data = f.read(args.sniff_bytes)
+
+    digest = f"{stat.st_size}:{hashlib.sha256(data).hexdigest()}"
+    text = cached_sniff_text(digest)
+    if text is None:
+        text = ""
+        if data.startswith(b"%PDF"):
+            for content in pdf_streams(data, deadline, args.sniff_bytes):
+                text += pdf_text(content, deadline) + " "
+                # Stop once the cover details are found or the first page is clearly behind us
+                if classify_text(text) or len(text) > sniff_text_chars or time.monotonic() > deadline:
+                    break
+        text = text[:sniff_text_chars]
+
+        if time.monotonic() > deadline:
+            if args.verbose:
+                print(f"Sniffing {file_path} ran out of time")
+            sniff_cache["timeouts"][digest] = {"budget": args.sniff_time, "text": text}
+        else:
+            sniff_cache["timeouts"].pop(digest, None)
+            sniff_cache["texts"][digest] = text
+
+    sniff_cache["files"][key] = [stat.st_size, stat.st_mtime_ns, digest]
+    sniff_cache_dirty = True
+    return text
+
+def sniff_file(file_path):
+    """
+    Classify a PDF from the text on its first page against the current codes table.
+    Returns a dictionary of review fields or None if nothing matched.
+    """
+    file_path = Path(file_path)
+    if file_path.suffix.lower() != ".pdf" or not file_path.is_file():
+        return None
+
+    result = classify_text(sniff_text(file_path))
+    if args.verbose:
+        print(f"Sniffed {file_path}: {result or 'no match'}")
+
+    return result
+
+def sniff_pattern(file_path):
+    # Fall back to the file contents when the name can't be parsed
+    fields = sniff_file(file_path)
+    if not fields:
+        return None
+
+    entry = {field: "" for field in review_fields}
+    entry.update(fields)
+    details = resolve_review_entry(entry)
+    if not details:
+        return None
+
+    return *details, "content"
+
 def unzip_rm_file(zip_file, target_dir, file_name):
     # Unzip a file into the target directory without moving the zip file, then delete the original file
     try:
@@ -489,12 +781,265 @@ def normalize_file(file_path, board, type_str, number, variant, year, month, cod
     file_path = Path(file_path.parent / file_name)
     return file_path
 
+def target_path(file_path, output_dir, details):
+    # Work out where a file with the given details belongs in the library
+    general_subject, detailed_subject, board, level, master_code, code, type_str, number, variant, year, month, pattern_number = [ item if item is not None else None for item in details ]            
+    year = str(year)
+
+    # Create directory structure
+    main_dir = Path(output_dir) / board / level / general_subject
+
+    if detailed_subject:
+        if master_code:
+            main_dir = main_dir / f"{detailed_subject} ({master_code})"
+        else:
+            main_dir = main_dir / f"{detailed_subject}"
+    if args.number:
+        main_dir = main_dir / number     
+
+    if type_str == "Syllabus":
+        target_dir = main_dir / "Syllabus"
+    elif type_str == "Notes":
+        target_dir = main_dir / "Notes"
+    elif type_str:
+        target_dir = main_dir / year / f"{month} {year}"
+
+    modified_file_path = normalize_file(file_path, board, type_str, number, variant, year, month, code)
+
+    return target_dir / modified_file_path.name
+
+def place_file(file_path, output_dir, details, pattern=None):
+    # Move, copy or unzip a file into the library given its parsed details
+
+    # Output details
+    if args.verbose:
+        print(f"File path: {file_path}")
+        print(f"File details: {details}")
+    if args.output_pattern:
+        print(f"Pattern details: {pattern}")
+
+    target_file = target_path(file_path, output_dir, details)
+    target_dir = target_file.parent
+    modified_file_name = target_file.name
+
+    # Skip invalid files
+    if file_path.is_file():
+        if not is_valid_file(file_path):
+            print(f"Error handling file {file_path}: file is not valid")
+            emit_plan(file_path, "skip", target_file, details, "file is not valid")
+            return None
+
+    # Skip already existing files
+    if os.path.exists(target_file) and not args.force:
+        if args.verbose:
+            print(f"Skipping: {file_path}, already exists at {target_file}")
+        emit_plan(file_path, "skip", target_file, details, "already exists")
+        return None
+
+    # Check if it's a dry run
+    if args.dry_run:
+        if file_path.suffix == ".zip":
+            emit_plan(file_path, "unzip", target_file, details)
+        else:
+            emit_plan(file_path, "copy" if args.copy else "move", target_file, details)
+
+        if not args.quiet: 
+            if file_path.suffix == ".zip":
+                print(f"Would unzip {file_path} to {target_file}")
+            elif args.copy:
+                print(f"Would copy {file_path} to {target_file}")
+            else:
+                print(f"Would move {file_path} to {target_file}")
+    else:
+        # Create the target directory structure
+        target_dir.mkdir(parents=True, exist_ok=True)
+
+        # Handle zip files separately
+        if file_path.suffix == ".zip":
+            record_manifest(unzip_rm_file(file_path, target_dir, modified_file_name))
+        else:
+            if args.copy:
+                if not args.quiet:
+                    print(f"Copying {file_path} to {target_file}")
+                shutil.copy(file_path, target_file)
+            else:
+                if not args.quiet:
+                    print(f"Moving {file_path} to {target_file}")
+                shutil.move(file_path, target_file)
+            record_manifest(target_file)
+
+    return target_file
+
+def hash_file(file_path):
+    """Hash a file with large sequential reads, returning its SHA-256 hex digest."""
+    digest = hashlib.sha256()
+    buffer = bytearray(hash_chunk_size)
+    view = memoryview(buffer)
+
+    with open(file_path, 'rb', buffering=0) as f:
+        while True:
+            size = f.readinto(buffer)
+            if not size:
+                break
+            digest.update(view[:size])
+
+    return digest.hexdigest()
+
+def read_manifest(directory):
+    """Load a directory's checksum manifest into a dictionary keyed by file name."""
+    manifest_file = Path(directory) / manifest_name
+    if not manifest_file.is_file():
+        return {}
+
+    with open(manifest_file, 'r', newline='') as f:
+        return {row["name"]: row for row in csv.DictReader(f)}
+
+def write_manifest(directory, entries):
+    """Replace a directory's checksum manifest, writing to a temporary file first."""
+    manifest_file = Path(directory) / manifest_name
+    temp_file = manifest_file.with_name(f"{manifest_name}.tmp")
+
+    with open(temp_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=manifest_fields)
+        writer.writeheader()
+        writer.writerows(entries[name] for name in sorted(entries))
+    os.replace(temp_file, manifest_file)
+
+def update_manifest(directory, names):
+    # Hash newly placed files and add them to their directory's manifest
+    entries = read_manifest(directory)
+    for name in names:
+        file_path = Path(directory) / name
+        stat = file_path.stat()
+        entries[name] = {"name": name, "size": stat.st_size, "mtime": stat.st_mtime_ns, "sha256": hash_file(file_path)}
+    write_manifest(directory, entries)
+
+def record_manifest(path):
+    # Record a placed file, or every file under a placed folder, in the manifests
+    if not path:
+        return
+
+    path = Path(path)
+    try:
+        if path.is_dir():
+            for root, dir_names, file_names in os.walk(path):
+                names = [name for name in file_names if not name.startswith(manifest_name)]
+                if names:
+                    update_manifest(root, names)
+        elif path.is_file():
+            update_manifest(path.parent, [path.name])
+    except OSError as e:
+        print(f"Error updating manifest for {path}: {e}")
+
+def verify(paths, full=False, jobs=None, update=False):
+    """
+    Check sorted files against their manifests, re-hashing only files whose size or mtime changed unless full is set.
+    With update, extra files are added to the manifests and entries whose content still matches get their size and
+    mtime refreshed; missing and corrupted files are only ever reported.
+    Returns True if every path was readable and nothing is missing, extra or corrupted.
+    """
+    missing, extra, corrupted, errors, checks = [], [], [], [], []
+    manifests = {}
+
+    def walk_error(e):
+        print(f"Error reading {e.filename}: {e.strerror}")
+        errors.append(e.filename)
+
+    for path in paths:
+        if not os.path.isdir(path):
+            print(f"Error: {path} is not a directory")
+            errors.append(path)
+            continue
+
+        for root, dir_names, file_names in os.walk(path, onerror=walk_error):
+            root = Path(root)
+            entries = manifests[root] = read_manifest(root)
+            names = {name for name in file_names if not name.startswith(manifest_name)}
+
+            for name, entry in entries.items():
+                try:
+                    stat = (root / name).stat() if name in names else None
+                except FileNotFoundError:
+                    stat = None
+                except OSError as e:
+                    print(f"Error reading {root / name}: {e}")
+                    errors.append(root / name)
+                    continue
+
+                if not stat:
+                    missing.append(root / name)
+                elif full or str(stat.st_size) != entry["size"] or str(stat.st_mtime_ns) != entry["mtime"]:
+                    checks.append((root, name, entry["sha256"]))
+
+            for name in sorted(names - entries.keys()):
+                if update:
+                    checks.append((root, name, None))
+                else:
+                    extra.append(root / name)
+
+    def check(item):
+        root, name, expected = item
+        try:
+            return hash_file(root / name)
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            print(f"Error reading {root / name}: {e}")
+            return ""
+
+    # Hashing releases the GIL on large buffers, so threads keep several disks busy
+    updated = set()
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        for (root, name, expected), digest in zip(checks, pool.map(check, checks)):
+            file_path = root / name
+            if digest is None:
+                # Deleted while we were walking
+                if expected:
+                    missing.append(file_path)
+                continue
+
+            if not digest:
+                errors.append(file_path)
+                continue
+
+            if expected and digest != expected:
+                corrupted.append(file_path)
+                continue
+
+            if args.verbose:
+                print(f"{'OK' if expected else 'Added'}: {file_path}")
+
+            if update:
+                try:
+                    stat = file_path.stat()
+                except FileNotFoundError:
+                    continue
+                manifests[root][name] = {"name": name, "size": stat.st_size, "mtime": stat.st_mtime_ns, "sha256": digest}
+                updated.add(root)
+
+    for root in updated:
+        write_manifest(root, manifests[root])
+
+    for label, files in (("Missing", missing), ("Extra", extra), ("Corrupted", corrupted)):
+        for file_path in files:
+            print(f"{label}: {file_path}")
+
+    if not args.quiet:
+        print(f"Hashed {len(checks)} file(s): {len(missing)} missing, {len(extra)} extra, {len(corrupted)} corrupted, {len(errors)} unreadable")
+
+    return not (missing or extra or corrupted or errors)
+
 def process_file(file_path, output_dir):
     # Process a file for moving
     try:
         # Get details
         result = parse_pattern(file_path, True)  
 
+        if not result and args.sniff:
+            result = sniff_pattern(file_path)
+            if result:
+                discard_review(file_path)
+
         if result:  # If result is not False or None
             *details, pattern = result
         else:
@@ -502,83 +1047,263 @@ def process_file(file_path, output_dir):
             pattern = None  # Default None for pattern
 
         if details:
-            general_subject, detailed_subject, board, level, master_code, code, type_str, number, variant, year, month, pattern_number = [ item if item is not None else None for item in details ]            
-            year = str(year)
-
+            place_file(file_path, output_dir, details, pattern)
+        else:
             # Output details
             if args.verbose:
-                print(f"File path: {file_path}")
-                print(f"File details: {details}")
-            if args.output_pattern:
-                print(f"Pattern details: {pattern}")
+                print(f"Skipping: {file_path}, no matching details")
+            if review_queue and review_queue[-1]["path"] == str(Path(file_path).resolve()):
+                emit_plan(file_path, "skip", reason="queued for review")
+            else:
+                emit_plan(file_path, "skip", reason="no matching details")
+    except Exception as e:
+        print(f"Error processing {file_path}: {e}")
+        emit_plan(file_path, "skip", reason="error")
+
+def emit_plan(file_path, action, target_file=None, details=None, reason=None):
+    # Print one machine-readable line of the dry-run plan, used by the GUI preview
+    if not getattr(args, "plan", False):  # Only the sort command has --plan
+        return
+
+    general_subject, detailed_subject, board = details[:3] if details else (None, None, None)
+    entry = {
+        "source": str(file_path),
+        "target": str(target_file) if target_file else None,
+        "action": action,
+        "board": board,
+        "subject": general_subject,
+        "detailed_subject": detailed_subject,
+        "reason": reason,
+    }
+    print(json.dumps(entry), flush=True)
+
+def queue_review(file_path, board, code, type_str, number, variant, year, month, pattern_number):
+    # Record a file whose details are incomplete so it can be resolved later with `review`
+    values = [Path(file_path).resolve(), board, code, type_str, month, year, number, variant, pattern_number]
+    entry = {field: "" if value is None else str(value) for field, value in zip(review_fields, values)}
+    review_queue.append(entry)
+
+    if args.verbose:
+        missing = ", ".join(review_missing(entry))
+        print(f"Queued {file_path} for review: missing {missing}")
+
+def discard_review(file_path):
+    # Drop a queued entry once the file has been resolved another way
+    path = str(Path(file_path).resolve())
+    review_queue[:] = [entry for entry in review_queue if entry["path"] != path]
+
+def review_field_valid(entry, field):
+    # Check a field parses the same way resolve_review_entry will read it
+    value = entry.get(field)
+    if not value:
+        return False
 
-            # Create directory structure
-            main_dir = Path(output_dir) / board / level / general_subject
+    if field == "board":
+        return bool(parse_board(value))
+    elif field == "code":
+        return f"{parse_board(entry.get('board'))}_{value.strip().upper()}" in codes
+    elif field == "type":
+        return bool(parse_type(value))
+    elif field == "month":
+        return bool(parse_month(value))
+    elif field == "year":
+        return value.strip().isdigit() and bool(parse_year(value))
+    return True
 
-            if detailed_subject:
-                if master_code:
-                    main_dir = main_dir / f"{detailed_subject} ({master_code})"
-                else:
-                    main_dir = main_dir / f"{detailed_subject}"
-            if args.number:
-                main_dir = main_dir / number     
-
-            if type_str == "Syllabus":
-                target_dir = main_dir / "Syllabus"
-            elif type_str == "Notes":
-                target_dir = main_dir / "Notes"
-            elif type_str:
-                target_dir = main_dir / year / f"{month} {year}"
-
-            modified_file_path = normalize_file(file_path, board, type_str, number, variant, year, month, code)
-            modified_file_name = modified_file_path.name 
-
-            target_file = target_dir / modified_file_name
-
-            # Skip invalid files
-            if file_path.is_file():
-                if not is_valid_file(file_path):
-                    print(f"Error handling file {file_path}: file is not valid")
-                    return None
-
-            # Skip already existing files
-            if os.path.exists(target_file) and not args.force:
-                if args.verbose:
-                    print(f"Skipping: {file_path}, already exists at {target_file}")
-                return None
-
-            # Check if it's a dry run
-            if args.dry_run:
-                if not args.quiet: 
-                    if file_path.suffix == ".zip":
-                        print(f"Would unzip {file_path} to {target_file}")
-                    elif args.copy:
-                        print(f"Would copy {file_path} to {target_file}")
-                    else:
-                        print(f"Would move {file_path} to {target_file}")
+def review_missing(entry):
+    # List the required fields an entry still needs before it can be placed, including ones that don't parse
+    missing = [field for field in review_required if not review_field_valid(entry, field)]
+
+    # A code unknown for its board may just as well be filed under the wrong board
+    if "code" in missing and entry.get("code") and "board" not in missing:
+        missing.insert(0, "board")
+
+    return missing
+
+def read_review_queue(review_file):
+    """Load review entries from the queue file, returning an empty list if it doesn't exist."""
+    if not os.path.isfile(review_file):
+        return []
+
+    with open(review_file, 'r', newline='') as f:
+        return [{field: (row.get(field) or "").strip() for field in review_fields} for row in csv.DictReader(f)]
+
+def write_review_queue(review_file, entries):
+    """Write review entries to the queue file, removing it once nothing is left to review."""
+    if not entries:
+        if os.path.isfile(review_file):
+            os.remove(review_file)
+        return
+
+    with open(review_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=review_fields)
+        writer.writeheader()
+        writer.writerows(entries)
+
+def save_review_queue(review_file):
+    # Merge newly queued files into the queue file, newest details winning
+    entries = {entry["path"]: entry for entry in read_review_queue(review_file)}
+    for entry in review_queue:
+        entries[entry["path"]] = entry
+
+    if args.dry_run:
+        if not args.quiet:
+            for entry in review_queue:
+                print(f"Would queue {entry['path']} for review: missing {', '.join(review_missing(entry))}")
+            print(f"Would queue {len(review_queue)} file(s) for review in {review_file}")
+        return
+
+    write_review_queue(review_file, list(entries.values()))
+    if not args.quiet:
+        print(f"Queued {len(review_queue)} file(s) for review in {review_file}, run `review` to resolve them")
+
+def review_group_key(entry):
+    # Similar names share a key: digit runs are collapsed and the missing fields must match
+    missing = tuple(review_missing(entry))
+    name = Path(entry["path"]).name.lower()
+
+    if "code" in missing:
+        # Keep 4-digit runs, which may be syllabus codes, so one code answer can't cover different subjects
+        name = re.sub(r"[0-9]+", lambda digits: digits.group() if len(digits.group()) == 4 else "#", name)
+    else:
+        name = re.sub(r"[0-9]+", "#", name)
+
+    return name, entry.get("board"), missing
+
+def resolve_review_entry(entry):
+    """
+    Turn a completed review entry into file details in the same order as parse_pattern.
+    Returns None if the entry is still incomplete or its code is unknown.
+    """
+    if review_missing(entry):
+        return None
+
+    board = parse_board(entry["board"])
+    code = entry["code"].upper()
+    type_str = parse_type(entry["type"])
+    month = parse_month(entry["month"])
+    year = parse_year(entry["year"])
+    number = entry["number"] or None
+    variant = entry["variant"] or None
+    pattern_number = int(entry["pattern"]) if entry["pattern"].isdigit() else None
+
+    if not board or not type_str or not month or not year:
+        if args.verbose:
+            print(f"Skipping {entry['path']}: invalid details")
+        return None
+
+    if number and not variant:
+        variant = "0"
+
+    details = codes[f"{board}_{code}"]
+    level, general_subject, detailed_subject, master_code = (details.get(key) for key in ["level", "general_subject", "detailed_subject", "master_code"])
+
+    return general_subject, detailed_subject, board, level, master_code, code, type_str, number, variant, year, month, pattern_number
+
+def review_target(entry, output_dir):
+    # Where a resolved entry would be placed
+    return target_path(Path(entry["path"]), output_dir, resolve_review_entry(entry))
+
+def review_targets(entries, output_dir, remaining):
+    """Group resolved entries by target, moving any whose target can't be worked out to remaining."""
+    targets = {}
+    for entry in entries:
+        try:
+            targets.setdefault(review_target(entry, output_dir), []).append(entry)
+        except Exception as e:
+            print(f"Error processing {entry['path']}: {e}")
+            remaining.append(entry)
+    return targets
+
+def review(review_file, output_dir):
+    # Resolve queued files in groups, then place every resolved file in a single pass
+    entries = read_review_queue(review_file)
+    if not entries:
+        print(f"Nothing to review in {review_file}")
+        return
+
+    groups = {}
+    for entry in entries:
+        groups.setdefault(review_group_key(entry), []).append(entry)
+
+    for (name, board, missing), group in groups.items():
+        if not missing:
+            continue
+
+        print(f"\n{len(group)} file(s) like {name} ({board or 'unknown board'}), missing {', '.join(missing)}:")
+        for entry in group[:5]:
+            known = ", ".join(f"{field}={entry[field]}" for field in review_fields[1:] if entry[field])
+            print(f"  {Path(entry['path']).name}: {known}")
+        if len(group) > 5:
+            print(f"  ... and {len(group) - 5} more")
+
+        answers = {}
+        try:
+            for field in missing:
+                while True:
+                    answer = input(f"Enter {field} here (blank to skip): ").strip()
+                    if not answer or review_field_valid({**group[0], **answers, field: answer}, field):
+                        break
+                    print(f"Invalid {field}: {answer}")
+                if not answer:
+                    break
+                answers[field] = answer
             else:
-                # Create the target directory structure
-                target_dir.mkdir(parents=True, exist_ok=True)
+                for entry in group:
+                    entry.update(answers)
+        except EOFError:
+            # No more answers, apply what has been resolved so far
+            print()
+            break
 
-                # Handle zip files separately
-                if file_path.suffix == ".zip":
-                    unzip_rm_file(file_path, target_dir, modified_file_name)
-                else:
-                    if args.copy:
-                        if not args.quiet:
-                            print(f"Copying {file_path} to {target_file}")
-                        shutil.copy(file_path, target_file)
-                    else:
-                        if not args.quiet:
-                            print(f"Moving {file_path} to {target_file}")
-                        shutil.move(file_path, target_file)
+    remaining = []
+    resolved = []
+    for entry in entries:
+        if not Path(entry["path"]).exists():
+            print(f"Dropping {entry['path']}: file no longer exists")
+        elif resolve_review_entry(entry):
+            resolved.append(entry)
+        else:
+            remaining.append(entry)
 
+    # Files answered together can normalise to the same name, so never let one overwrite another
+    targets = review_targets(resolved, output_dir, remaining)
+    resolved = [entry for group in targets.values() for entry in group]
+    clashes = [group for group in targets.values() if len(group) > 1]
+    try:
+        for group in clashes:
+            print(f"\n{len(group)} file(s) would all be placed at {review_target(group[0], output_dir)}:")
+            for entry in group:
+                answer = input(f"Enter paper number for {Path(entry['path']).name} (blank to keep in queue): ").strip()
+                if answer:
+                    entry["number"], entry["variant"] = parse_paper(answer)
+    except EOFError:
+        print()
+
+    placeable = []
+    for target, group in review_targets(resolved, output_dir, remaining).items():
+        if len(group) > 1:
+            for entry in group:
+                print(f"Keeping {entry['path']} in queue: {len(group)} files would be placed at {target}")
+            remaining.extend(group)
         else:
-            # Output details
-            if args.verbose:
-                print(f"Skipping: {file_path}, no matching details")
-    except Exception as e:
-        print(f"Error processing {file_path}: {e}")
+            placeable.extend(group)
+
+    for entry in placeable:
+        file_path = Path(entry["path"])
+        details = resolve_review_entry(entry)
+        try:
+            if not place_file(file_path, output_dir, details) or args.dry_run:
+                remaining.append(entry)
+        except Exception as e:
+            print(f"Error processing {file_path}: {e}")
+            remaining.append(entry)
+
+    if args.dry_run:
+        print(f"Would leave {len(remaining)} file(s) in {review_file}")
+    else:
+        write_review_queue(review_file, remaining)
+        print(f"{len(entries) - len(remaining)} file(s) placed, {len(remaining)} left in {review_file}")
 
 def collect_files_and_dirs(paths):#ArchNigger
     files = []
@@ -612,19 +1337,19 @@ def collect_files_and_dirs(paths):#ArchNigger
                 for file_name in file_names:
                     files.append(Path(root) / file_name)
 
-    return files, dirs, urls
+    if args.exclude_file:
+        # Leave out anything deselected in the preview
+        with open(args.exclude_file, 'r', encoding="utf-8") as f:
+            excluded = {line.rstrip("\n") for line in f if line.strip()}
+        files = [file for file in files if str(file) not in excluded]
+        dirs = [dir for dir in dirs if str(dir) not in excluded]
 
-def main():
-    # Global arrays for arguments and codes
-    global args
-    global codes
+    return files, dirs, urls
 
-    # Get arguments
-    parser = argparse.ArgumentParser(description="A custom-built tool to sort IGCSE past paper files.")
-    parser.add_argument("paths", nargs='+', help="paths to files or directories to process")
+def add_common_arguments(parser):
+    # Options shared by sorting and reviewing, since both place files into the library
     parser.add_argument("-o", "--output", help="directory to store sorted files")
     parser.add_argument("-c", "--codes", nargs='+', help="files containing board codes")
-    parser.add_argument("-r", "--recursive", action="store_true", help="index files recursively")
     parser.add_argument("-n", "--dry-run", action="store_true", help="show what would happen without making changes")
     parser.add_argument("-v", "--verbose", action="store_true", help="print detailed information")
     parser.add_argument("-q", "--quiet", action="store_true", help="output only errors")
@@ -632,15 +1357,66 @@ def main():
     parser.add_argument("-C", "--copy", action="store_true", help="copy instead of moving files")
     parser.add_argument("-P", "--output-pattern", action="store_true", help="output the pattern being matched")
     parser.add_argument("-N", "--number", action="store_true", help="add the paper number to the directory structure")
+    parser.add_argument("-R", "--review-file", default="paperctl-review.csv", help="file to queue files needing manual review")
+
+def main():
+    # Global arrays for arguments and codes
+    global args
+    global codes
+
+    # Get arguments
+    if len(sys.argv) > 1 and sys.argv[1] == "review":
+        parser = argparse.ArgumentParser(prog="paperctl review", description="Resolve files queued with -m and sort them.")
+        add_common_arguments(parser)
+        args = parser.parse_args(sys.argv[2:])
+
+        if args.codes:
+            codes = load_codes(args.codes)
+
+        review(args.review_file, args.output)
+        return
+
+    if len(sys.argv) > 1 and sys.argv[1] == "verify":
+        parser = argparse.ArgumentParser(prog="paperctl verify", description="Check sorted files against their checksum manifests.")
+        parser.add_argument("paths", nargs='+', help="sorted directories to verify")
+        parser.add_argument("--full", action="store_true", help="re-hash every file, not only those whose size or mtime changed")
+        parser.add_argument("--update", action="store_true", help="add extra files to the manifests and refresh entries whose content still matches")
+        parser.add_argument("-j", "--jobs", type=int, help="number of files to hash in parallel")
+        parser.add_argument("-v", "--verbose", action="store_true", help="print detailed information")
+        parser.add_argument("-q", "--quiet", action="store_true", help="output only errors")
+        args = parser.parse_args(sys.argv[2:])
+
+        if not verify(args.paths, args.full, args.jobs, args.update):
+            sys.exit(1)
+        return
+
+    parser = argparse.ArgumentParser(description="A custom-built tool to sort IGCSE past paper files.")
+    parser.add_argument("paths", nargs='+', help="paths to files or directories to process")
+    add_common_arguments(parser)
+    parser.add_argument("-r", "--recursive", action="store_true", help="index files recursively")
     parser.add_argument("-Q", "--quit", action="store_true", help="quit on some errors")
-    parser.add_argument("-m", "--manual", action="store_true", help="manually enter data if needed")
+    parser.add_argument("-m", "--manual", action="store_true", help="queue files with missing details for `review`")
+    parser.add_argument("--plan", action="store_true", help="dry run, printing the plan as JSON lines")
+    parser.add_argument("-x", "--exclude-file", help="file listing paths to leave out, one per line")
+    parser.add_argument("-s", "--sniff", action="store_true", help="read the first page of unparseable PDFs to find their details")
+    parser.add_argument("--sniff-bytes", type=int, default=1024 * 1024, help="maximum bytes to read from each file when sniffing")
+    parser.add_argument("--sniff-time", type=float, default=2.0, help="maximum seconds to spend sniffing each file")
+    parser.add_argument("--sniff-cache", default="paperctl-sniff.json", help="file to cache sniffed results in")
+    parser.add_argument("--sniff-retry", action="store_true", help="sniff files again that ran out of time on an earlier run")
 
     args = parser.parse_args()
 
+    if args.plan:
+        args.dry_run = True
+        args.quiet = True
+
     # Load the codes
     if args.codes:
         codes = load_codes(args.codes)
     
+    if args.sniff:
+        load_sniff_cache(args.sniff_cache)
+
     files, dirs, urls = collect_files_and_dirs(args.paths)
 
     for file in files:
@@ -649,5 +1425,11 @@ def main():
     for dir in dirs:
         process_file(dir, args.output)
 
+    if args.sniff:
+        save_sniff_cache(args.sniff_cache)
+
+    if review_queue:
+        save_review_queue(args.review_file)
+
 if __name__ == "__main__":
     main()